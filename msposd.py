@@ -4,8 +4,14 @@
 import abc
 import argparse
 import array
+import collections
+import concurrent.futures
+import csv
 import enum
+import functools
 import io
+import itertools
+import mmap
 import os
 import struct
 import typing
@@ -25,6 +31,87 @@ MAX_X = 60
 MAX_Y = 22
 MAX_T = MAX_X * MAX_Y
 
+# Символы, из которых по умолчанию состоит значение
+ALLOWED_CHARS = b'0123456789.-: '
+
+
+@functools.lru_cache(maxsize=8)
+def _make_lut(allowed: bytes) -> bytes:
+    """
+    Таблица принадлежности кода к набору символов: проверка за одно обращение по индексу
+    :param allowed: разрешенные символы
+    :return: 256 байт, 1 для разрешенного кода и 0 для остальных
+    """
+    return bytes(int(c in allowed) for c in range(256))
+
+
+@functools.lru_cache(maxsize=8)
+def _make_stop_table(allowed: bytes) -> bytes:
+    """
+    Таблица для bytes.translate, обратная _make_lut
+    :param allowed: разрешенные символы
+    :return: 256 байт, 0 для разрешенного кода и 1 для остальных
+    """
+    return bytes(flag ^ 1 for flag in _make_lut(allowed))
+
+
+@functools.lru_cache(maxsize=8)
+def _make_inav_tables(allowed: bytes, reverse: bool):
+    """
+    Таблицы разбора цифр INAV: символы 0xA1..0xAA - цифра с точкой после нее,
+    0xB1..0xBA - цифра с точкой перед ней. half_point - точка уже выведена соседней ячейкой
+    :param allowed: разрешенные символы
+    :param reverse: строка обходится справа налево
+    :return: кортеж (decode, half_next): decode[half_point][ch] - байты для вывода или None, если символ
+             не разрешен; half_next[ch] - значение half_point после символа ch
+    """
+    lut = _make_lut(allowed)
+    decode = ([], [])
+    half_next = bytearray(256)
+    dot = ord(b'.')
+    for ch in range(256):
+        for half_point in (0, 1):
+            if 0xA1 <= ch <= 0xAA:
+                digit = ch - 0xA1 + ord(b'0')
+                if not reverse:
+                    chs = [digit, dot]
+                elif half_point:
+                    chs = [digit]
+                else:
+                    chs = [dot, digit]
+            elif 0xB1 <= ch <= 0xBA:
+                digit = ch - 0xB1 + ord(b'0')
+                if reverse:
+                    chs = [digit, dot]
+                elif half_point:
+                    chs = [digit]
+                else:
+                    chs = [dot, digit]
+            else:
+                chs = [ch]
+            decode[half_point].append(bytes(chs) if all(lut[c] for c in chs) else None)
+        # Точка переходит к следующей ячейке только после цифры с точкой со стороны обхода
+        half_next[ch] = (0xB1 <= ch <= 0xBA) if reverse else (0xA1 <= ch <= 0xAA)
+    return decode, bytes(half_next)
+
+
+# Отображаемый символ для каждого возможного кода ячейки (см. Frame.code_to_char)
+_CODE2CHAR = ['u'] * 0x10000
+_CODE2CHAR[0] = '~'
+_CODE2CHAR[0x20:0x5f] = map(chr, range(0x20, 0x5f))
+
+
+@functools.lru_cache(maxsize=None)
+def _code2hex() -> typing.List[str]:
+    """
+    Ячейка для шестнадцатеричного дампа (Frame.hex1) для каждого возможного кода.
+    Строится при первом обращении
+    """
+    lut = ['{:02X}|'.format(code) for code in range(0x10000)]
+    lut[0] = '  |'
+    lut[0x20:0x5f] = (chr(code) + ' |' for code in range(0x20, 0x5f))
+    return lut
+
 
 class CharsBetaflight:
     ALT = 0x7F  # высота
@@ -75,21 +162,56 @@ class Frame:
     HEADER_SIZE = struct.calcsize(HEADER_FMT)
 
     def __init__(self, data: bytes):
-        self.rawdata = data
-        values = struct.unpack(self.HEADER_FMT, data[:self.HEADER_SIZE])
-        self.header = dict(zip(
-            ('frame_idx', 'size'),
-            values
-        ))
-        self.ar = array.array('H', data[self.HEADER_SIZE:])
+        self.frame_idx, self.size = struct.unpack_from(self.HEADER_FMT, data)
+        # Кадр хранит только младшие и старшие байты кодов ячеек (little-endian): по ним идет поиск
+        # внутри bytes, из них же собираются коды. Сам data после разбора не удерживается
+        self._low = data[self.HEADER_SIZE::2]
+        self._high = data[self.HEADER_SIZE + 1::2]
+        self._ar = None
+
+    @property
+    def ar(self):
+        """
+        Коды всех ячеек по столбцам. Массив собирается при первом обращении
+        :return: array.array('H')
+        """
+        if self._ar is None:
+            self._ar = array.array('H', (low | high << 8 for low, high in zip(self._low, self._high)))
+        return self._ar
+
+    def _code(self, i):
+        return self._low[i] | self._high[i] << 8
+
+    def _codes(self, cells: slice):
+        """
+        Коды ячеек из среза
+        :param cells: срез индексов ячеек
+        :return: последовательность кодов
+        """
+        low, high = self._low[cells], self._high[cells]
+        if high.count(0) == len(high):
+            # Все коды меньше 256: младшие байты и есть коды
+            return low
+        return [lo | hi << 8 for lo, hi in zip(low, high)]
+
+    def find(self, code, start=0):
+        """
+        Найти ячейку с заданным кодом
+        :param code: код символа
+        :param start: индекс ячейки, с которой начинать поиск
+        :return: индекс первой найденной ячейки или -1, если символа в кадре нет
+        """
+        low, high = code & 0xFF, code >> 8
+        # Поиск по младшим байтам выполняется bytes.find, старший байт только проверяется
+        idx = self._low.find(low, start)
+        while idx >= 0 and self._high[idx] != high:
+            idx = self._low.find(low, idx + 1)
+        return idx
 
     def __str__(self):
         sl = []
         for row in range(MAX_Y):
-            for col in range(MAX_X):
-                i = col * MAX_Y + row
-                ch = self.code_to_char(self.ar[i])
-                sl.append(ch)
+            sl.extend(map(_CODE2CHAR.__getitem__, self._codes(slice(row, None, MAX_Y))))
             sl.append('\n')
         return ''.join(sl)
 
@@ -106,7 +228,7 @@ class Frame:
     def cell(self, x, y):
         if x >= MAX_X or y >= MAX_Y:
             raise ValueError
-        return self.ar[x * MAX_Y + y]
+        return self._code(x * MAX_Y + y)
 
     def __getitem__(self, item):
         if not isinstance(item, tuple) or len(item) != 2:
@@ -116,30 +238,24 @@ class Frame:
     def line(self, y):
         if y < 0 or y >= MAX_Y:
             raise ValueError
-        return tuple(self.ar[x * MAX_Y + y] for x in range(MAX_X))
+        # Сетка хранится по столбцам, поэтому строка - это срез с шагом MAX_Y
+        return tuple(self._codes(slice(y, None, MAX_Y)))
 
     def sline(self, y):
-        line = self.line(y)
-        return ''.join(self.code_to_char(c) for c in line)
+        if y < 0 or y >= MAX_Y:
+            raise ValueError
+        return ''.join(map(_CODE2CHAR.__getitem__, self._codes(slice(y, None, MAX_Y))))
 
     def hex1(self):
+        lut = _code2hex()
         sl = []
         for row in range(MAX_Y):
-            for col in range(MAX_X):
-                i = col * MAX_Y + row
-                code = self.ar[i]
-                if code == 0:
-                    ch = '  |'
-                elif 0x20 <= code < 0x5f:
-                    ch = chr(code) + ' |'
-                else:
-                    ch = '{:02X}|'.format(code)
-                sl.append(ch)
+            sl.extend(map(lut.__getitem__, self._codes(slice(row, None, MAX_Y))))
             sl.append('\n')
         return ''.join(sl)
 
     @abc.abstractmethod
-    def extract_value(self, tag, reverse=False, allowed_chars=b'0123456789.-: '):
+    def extract_value(self, tag, reverse=False, allowed_chars=ALLOWED_CHARS):
         pass
 
     @abc.abstractmethod
@@ -170,7 +286,7 @@ class FrameBetaflight(Frame):
 
     Chars = CharsBetaflight
 
-    def extract_value(self, tag, reverse=False, allowed_chars=b'0123456789.-: '):
+    def extract_value(self, tag, reverse=False, allowed_chars=ALLOWED_CHARS):
         """
         Вырезает подстроку после или до символа tag
         :param tag: символ, начиная от которого вырезать
@@ -178,24 +294,27 @@ class FrameBetaflight(Frame):
         :param allowed_chars: разрешенные символы
         :return: кортеж из вырезанной строки и следующего символа или (None, None) если строка не найдена
         """
-        try:
-            idx = self.ar.index(tag)
-        except ValueError:
+        idx = self.find(tag)
+        if idx < 0:
             return None, None
-        x, y = idx // MAX_Y, idx % MAX_Y
-        line = self.line(y)
+        # Ячейки строки правее (или левее) символа, в порядке обхода, одним срезом с шагом MAX_Y
         if reverse:
-            line = line[::-1]
-            x = MAX_X - 1 - x
-        sl = bytearray()
-        next_char = None
-        for i in range(x + 1, len(line)):
-            ch = line[i]
-            if ch in allowed_chars:
-                sl.append(ch)
-            else:
-                next_char = ch
-                break
+            start, step = idx - MAX_Y, -MAX_Y
+        else:
+            start, step = idx + MAX_Y, MAX_Y
+        if start < 0:
+            cells, high = b'', b''
+        else:
+            cells, high = self._low[start::step], self._high[start::step]
+        # Таблицы кэшируются по allowed_chars, поэтому bytearray, множество кодов и т.п. приводятся к bytes.
+        # Первый неразрешенный символ ищется в C: translate помечает такие байты единицей.
+        # Коды >= 256 (ненулевой старший байт) разрешенными не бывают
+        stop = cells.translate(_make_stop_table(bytes(allowed_chars))).find(1)
+        if stop < 0:
+            stop = len(cells)
+        stop = min(stop, len(high) - len(high.lstrip(b'\x00')))
+        sl = cells[:stop]
+        next_char = self._code(start + stop * step) if stop < len(cells) else None
         if reverse:
             sl = sl[::-1]
             next_char = tag
@@ -216,73 +335,52 @@ class FrameBetaflight(Frame):
         return self.extract_value(self.Chars.SPEED)
 
     def extract_power(self):
-        digits = b'0123456789'
-        for idx, v in enumerate(self.ar):
-            if v == ord(b'W'):
-                if self.ar[idx - MAX_Y] in digits:
-                    if self.ar[idx + MAX_Y] in b'\x00 ':
-                        x, y = idx // MAX_Y, idx % MAX_Y
-                        line = self.line(y)
-                        s = bytearray()
-                        for i in range(x, -1, -1):
-                            if line[i] in digits:
-                                s.insert(0, line[i])
-                        val = s.decode('ascii')
-                        return val, ord(b'W')
-        return None, None
+        digits = _make_lut(b'0123456789')
+        watt = ord(b'W')
+        idx = -1
+        while True:
+            idx = self.find(watt, idx + 1)
+            if idx < 0:
+                return None, None
+            if idx < MAX_Y:
+                # Слева от символа ничего нет
+                continue
+            left = self._code(idx - MAX_Y)
+            right = self._code(idx + MAX_Y) if idx + MAX_Y < MAX_T else 0
+            if left < 256 and digits[left] and right in (0, 0x20):
+                # Цифры строки от ее начала до символа W включительно, в прямом порядке
+                y = idx % MAX_Y
+                s = bytes(c for c in self._codes(slice(y, idx + 1, MAX_Y)) if c < 256 and digits[c])
+                val = s.decode('ascii')
+                return val, watt
 
 
 class FrameInav(Frame):
     """
     Кадр OSD INAV
     """
-    def extract_value(self, tag, reverse=False, allowed_chars=b'0123456789.-: '):
-        try:
-            idx = self.ar.index(tag)
-        except ValueError:
+    def extract_value(self, tag, reverse=False, allowed_chars=ALLOWED_CHARS):
+        idx = self.find(tag)
+        if idx < 0:
             return None, None
-        x, y = idx // MAX_Y, idx % MAX_Y
-        line = self.line(y)
+        # Ячейки строки правее (или левее) символа, в порядке обхода, одним срезом с шагом MAX_Y
         if reverse:
-            line = line[::-1]
-            x = MAX_X - 1 - x
+            start, step = idx - MAX_Y, -MAX_Y
+        else:
+            start, step = idx + MAX_Y, MAX_Y
+        tail = self._codes(slice(start, None, step)) if start >= 0 else ()
+        # Таблицы кэшируются по allowed_chars, поэтому bytearray, множество кодов и т.п. приводятся к bytes
+        decode, half_next = _make_inav_tables(bytes(allowed_chars), reverse)
         sl = bytearray()
         next_char = None
-        half_point = False
-        for i in range(x + 1, len(line)):
-            ch = line[i]
-            # Обработать цифры с точкой
-            if reverse:
-                if 0xA1 <= ch <= 0xAA:
-                    if half_point:
-                        chs = [ch - 0xA1 + ord(b'0')]
-                        half_point = False
-                    else:
-                        chs = [ord(b'.'), ch - 0xA1 + ord(b'0')]
-                elif 0xB1 <= ch <= 0xBA:
-                    chs = [ch - 0xB1 + ord(b'0'), ord(b'.')]
-                    half_point = True
-                else:
-                    half_point = False
-                    chs = [ch]
-            else:
-                if 0xA1 <= ch <= 0xAA:
-                    chs = [ch - 0xA1 + ord(b'0'), ord(b'.')]
-                    half_point = True
-                elif 0xB1 <= ch <= 0xBA:
-                    if half_point:
-                        half_point = False
-                        chs = [ch - 0xB1 + ord(b'0')]
-                    else:
-                        chs = [ord(b'.'), ch - 0xB1 + ord(b'0')]
-                else:
-                    half_point = False
-                    chs = [ch]
-            if all(x in allowed_chars for x in chs):
-                sl.extend(chs)
-            else:
+        half_point = 0
+        for ch in tail:
+            chs = decode[half_point][ch] if ch < 256 else None
+            if chs is None:
                 next_char = ch
                 break
+            sl += chs
+            half_point = half_next[ch]
         if reverse:
             sl = sl[::-1]
             next_char = tag
@@ -330,6 +428,13 @@ class Reader:
     """
     HEADER_FMT = b'<7sHBBBBHHB'
     HEADER_SIZE = struct.calcsize(HEADER_FMT)
+    Header = collections.namedtuple('Header', ('magic', 'version', 'char_width', 'char_height', 'font_width',
+                                               'font_height', 'x_offset', 'y_offset', 'font_variant'))
+    # Класс кадра для каждого поддерживаемого варианта шрифта
+    FRAME_CLASSES = {
+        FontVariant.BETAFLIGHT: FrameBetaflight,
+        FontVariant.INAV: FrameInav,
+    }
 
     def __init__(self, fileobj: typing.BinaryIO):
         """
@@ -338,19 +443,57 @@ class Reader:
         self._fileobj = fileobj
         # Читать заголовок
         _header_data = fileobj.read(self.HEADER_SIZE)
-        values = struct.unpack(self.HEADER_FMT, _header_data)
-        self._header = dict(zip(
-            ('magic', 'version', 'char_width', 'char_height', 'font_width', 'font_height', 'x_offset', 'y_offset',
-             'font_variant'),
-            values))
-        if self._header['magic'] != OSD_MAGIC:
+        self._header = self.Header._make(struct.unpack(self.HEADER_FMT, _header_data))
+        if self._header.magic != OSD_MAGIC:
             raise ValueError('Incorrect magic in file header. expected: {}, got: {}'.format(OSD_MAGIC,
-                                                                                            self._header['magic']))
-        if self._header['version'] != OSD_VERSION:
+                                                                                            self._header.magic))
+        if self._header.version != OSD_VERSION:
             raise ValueError('Invalid osd file version. expected: {}, got: {}'.format(OSD_VERSION,
-                                                                                      self._header['version']))
+                                                                                      self._header.version))
+        self._frame_cls = self.FRAME_CLASSES.get(self._header.font_variant)
+        if self._frame_cls is None:
+            raise NotImplementedError('Font variant "{}" not supported yet'.format(self._header.font_variant))
+        self._frame_size = Frame.HEADER_SIZE + MAX_T * 2
+        # Отобразить файл в память целиком, чтобы не делать seek+read на каждый кадр
+        try:
+            self._mm = mmap.mmap(fileobj.fileno(), 0, access=mmap.ACCESS_READ)
+        except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+            # Файловый объект без дескриптора (например, BytesIO)
+            self._mm = None
+        # Количество целых кадров в файле определяется один раз по его размеру
+        if self._mm is not None:
+            file_size = len(self._mm)
+        else:
+            file_size = fileobj.seek(0, io.SEEK_END)
+        self._frame_count = max(0, (file_size - self.HEADER_SIZE) // self._frame_size)
         self._iter_index = 0
 
+    def close(self):
+        """
+        Освободить отображение файла в память
+        :return:
+        """
+        mm = getattr(self, '_mm', None)
+        if mm is not None:
+            mm.close()
+            self._mm = None
+
+    def __del__(self):
+        self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __len__(self):
+        """
+        Количество кадров в файле
+        :return:
+        """
+        return self._frame_count
+
     def __iter__(self):
         """
         Получить итератор по кадрам
@@ -360,17 +503,15 @@ class Reader:
         return self
 
     def get_frame(self, index):
-        frame_data_size = Frame.HEADER_SIZE + MAX_T * 2
-        self._fileobj.seek(self.HEADER_SIZE + frame_data_size * index, io.SEEK_SET)
-        frame_data = self._fileobj.read(frame_data_size)
-        if len(frame_data) != frame_data_size:
+        if index < 0 or index >= self._frame_count:
             return None
-        if self._header['font_variant'] == FontVariant.BETAFLIGHT:
-            return FrameBetaflight(frame_data)
-        elif self._header['font_variant'] == FontVariant.INAV:
-            return FrameInav(frame_data)
+        offset = self.HEADER_SIZE + self._frame_size * index
+        if self._mm is not None:
+            frame_data = self._mm[offset:offset + self._frame_size]
         else:
-            raise NotImplementedError('Font variant "{}" not supported yet'.format(self._header['font_variant']))
+            self._fileobj.seek(offset, io.SEEK_SET)
+            frame_data = self._fileobj.read(self._frame_size)
+        return self._frame_cls(frame_data)
 
     def __next__(self):
         """
@@ -392,11 +533,41 @@ class Reader:
             return frame
 
 
+def _extract_frames(osdpath, start=0, stop=None, skip=False):
+    """
+    Извлечь значения из диапазона кадров файла OSD
+    :param osdpath: Путь к файлу OSD
+    :param start: Индекс первого кадра
+    :param stop: Индекс кадра, следующего за последним, None - до конца файла
+    :param skip: Пропускать кадры, в которых найдены не все значения
+    :return: список кортежей (frame_idx, latitude, longitude, altitude, speed, power); отсутствующие значения - None
+    """
+    rows = []
+    with open(osdpath, 'rb') as fp, Reader(fp) as rd:
+        if stop is None:
+            stop = len(rd)
+        for index in range(start, stop):
+            fr = rd.get_frame(index)
+            lat, _ = fr.extract_lat()
+            lon, _ = fr.extract_lon()
+            alt, _ = fr.extract_alt()
+            spd, _ = fr.extract_speed()
+            pwr, _ = fr.extract_power()
+            if lat is None and lon is None and alt is None and spd is None and pwr is None:
+                # Если не извлечено ни одного значения
+                continue
+            if skip:
+                if lat is None or lon is None or alt is None or spd is None or pwr is None:
+                    continue
+            rows.append((fr.frame_idx, lat, lon, alt, spd, pwr))
+    return rows
+
+
 class Track:
     """
     Класс для извлечения трека из OSD
     """
-    def __init__(self, osdpath: str, onerror='prev', fps=60):
+    def __init__(self, osdpath: str, onerror='prev', fps=60, workers=1):
         """
         :param osdpath: Путь к файлу OSD
         :param onerror: Действие при ошибке получения значения:
@@ -404,54 +575,80 @@ class Track:
                         skip - пропустить точку
                         empty - пустое значение
         :param fps: Частота кадров видео
+        :param workers: Количество процессов для разбора кадров, None - по числу процессоров.
+                        Дополнительные процессы окупаются только на больших файлах и многоядерных машинах
         """
+        if onerror not in ('prev', 'skip', 'empty'):
+            raise ValueError('Unknown onerror action: {}'.format(onerror))
+        if workers is not None and workers < 1:
+            raise ValueError('workers must be >= 1 or None')
         self.header = ('latitude', 'longitude', 'altitude', 'speed', 'time_ms', 'power')
-        self.points = []
-        prev = [''] * len(self.header)
-        with open(osdpath, 'rb') as fp:
-            rd = Reader(fp)
-            for fr in rd:
-                frame_idx = fr.header['frame_idx']
-                lat, _ = fr.extract_lat()
-                lon, _ = fr.extract_lon()
-                alt, _ = fr.extract_alt()
-                spd, _ = fr.extract_speed()
-                pwr, _ = fr.extract_power()
-                if all(v is None for v in (lat, lon, alt, spd, pwr)):
-                    # Если не извлечено ни одного значения
-                    continue
-                if onerror == 'skip':
-                    if any(i is None for i in (lat, lon, alt, spd, pwr)):
-                        continue
-                elif onerror == 'empty':
-                    lat = lat or ''
-                    lon = lon or ''
-                    alt = alt or ''
-                    spd = spd or ''
-                    pwr = pwr or ''
-                elif onerror == 'prev':
-                    lat = lat or prev[0]
-                    lon = lon or prev[1]
-                    alt = alt or prev[2]
-                    spd = spd or prev[3]
-                    pwr = pwr or prev[5]
-                    prev = (lat, lon, alt, spd, None, pwr)
-                ts = int(frame_idx * 1000 / fps)
-                self.points.append([lat, lon, alt, spd, ts, pwr])
+        skip = onerror == 'skip'
+        if workers == 1:
+            rows = _extract_frames(osdpath, skip=skip)
+        else:
+            with open(osdpath, 'rb') as fp, Reader(fp) as rd:
+                frame_count = len(rd)
+            workers = workers or os.cpu_count() or 1
+            # Кадры независимы: диапазоны разбираются в отдельных процессах, по несколько на процесс
+            chunk_size = max(1, -(-frame_count // (workers * 4)))
+            starts = range(0, frame_count, chunk_size)
+            stops = [min(start + chunk_size, frame_count) for start in starts]
+            with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+                chunks = executor.map(_extract_frames, itertools.repeat(osdpath), starts, stops,
+                                      itertools.repeat(skip))
+                rows = list(itertools.chain.from_iterable(chunks))
+        # Точки трека хранятся по колонкам; список точек строится только при обращении к points
+        self._points = None
+        columns = [list(column) for column in zip(*rows)] or [[] for _ in range(6)]
+        frame_ids, self._lat, self._lon, self._alt, self._spd, self._pwr = columns
+        # Пропуски заполняются по колонкам целиком, после разбора всех кадров
+        for column in columns[1:]:
+            if onerror == 'empty':
+                column[:] = [v or '' for v in column]
+            elif onerror == 'prev':
+                column[:] = itertools.accumulate(column, lambda prev, v: v or prev, initial='')
+                del column[0]
+        self._ts = [int(frame_idx * 1000 / fps) for frame_idx in frame_ids]
+
+    @property
+    def points(self):
+        """
+        Точки трека. Список строится при первом обращении и дальше возвращается тот же самый,
+        его изменения учитываются в save_csv
+        :return: список точек [latitude, longitude, altitude, speed, time_ms, power]
+        """
+        if self._points is None:
+            self._points = [list(point) for point in zip(self._lat, self._lon, self._alt, self._spd, self._ts,
+                                                         self._pwr)]
+        return self._points
+
+    @points.setter
+    def points(self, value):
+        self._points = value
 
     def save_csv(self, csvpath, encoding='ascii', sep=',', eol='\n'):
         """
         Сохранить трек в CSV-файл
         :param encoding: Кодировка выходного файла
-        :param sep: Разделитель колонок
+        :param sep: Разделитель колонок. Если это один символ, значения, содержащие его, заключаются в кавычки
+                    (csv.writer); иначе колонки просто соединяются через sep
         :param eol: Окончание строки
         :param csvpath: Путь к файлу csv
         :return:
         """
+        if self._points is not None:
+            rows = self._points
+        else:
+            rows = zip(self._lat, self._lon, self._alt, self._spd, self._ts, self._pwr)
         with open(csvpath, 'w', encoding=encoding) as fp:
-            fp.write(sep.join(self.header) + eol)
-            for point in self.points:
-                fp.write(sep.join(str(x) for x in point) + eol)
+            if len(sep) == 1:
+                writer = csv.writer(fp, delimiter=sep, lineterminator=eol)
+                writer.writerow(self.header)
+                writer.writerows(rows)
+            else:
+                fp.write(sep.join(self.header) + eol)
+                fp.writelines(sep.join(map(str, row)) + eol for row in rows)
 
 
 if __name__ == '__main__':
@@ -460,9 +657,13 @@ if __name__ == '__main__':
     parser.add_argument('-o', metavar='CSVFILE', dest='outputfile', default='output.csv', help='output .csv file')
     parser.add_argument('-f', dest='force', default=False, action='store_true',
                         help='Force overwrite output file if exists')
+    parser.add_argument('-j', metavar='N', dest='workers', type=int, default=1,
+                        help='Number of worker processes, 0 to use all CPUs')
     parser.add_argument('inputfile', metavar='OSDFILE', help='input .osd file')
     args = parser.parse_args()
-    trk = Track(args.inputfile, onerror='prev')
+    if args.workers < 0:
+        parser.error('argument -j: must be >= 0')
+    trk = Track(args.inputfile, onerror='prev', workers=args.workers or None)
     if os.path.exists(args.outputfile) and not args.force:
         print('Error: File "{}" already exists'.format(args.outputfile))
         exit(1)